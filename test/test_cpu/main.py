@@ -1,4 +1,7 @@
+import tempfile
 import unittest
+from types import SimpleNamespace
+from unittest import mock
 
 from tritonbench.operators import load_opbench_by_name
 from tritonbench.operators_collection import list_operators_by_collection
@@ -72,3 +75,91 @@ class TestTritonbenchCpu(unittest.TestCase):
         self.assertTrue(len(default_ops) > 0)
         liger_ops = list_operators_by_collection("liger")
         self.assertTrue(len(liger_ops) > 0)
+
+    def test_cpu_ncu_read_report(self):
+        # read_ncu_report on a stub ncu_report module must match the per-kernel
+        # formulas of the NCU roofline sections.
+        from tritonbench.components.ncu import ncu_analyzer
+
+        names = ncu_analyzer.short_ncu_metric_name
+        kernels = [
+            {
+                names["inst_executed_fadd"]: 10.5 * i,
+                names["inst_executed_fmul"]: 3.25 * i,
+                names["inst_executed_ffma"]: 7.0 + i,
+                names["inst_executed_dadd"]: 0.5 * i,
+                names["inst_executed_dmul"]: 1.5,
+                names["inst_executed_dfma"]: 0.25 * i,
+                names["sm_freq"]: 1.4e9 + 1e8 * i,
+                names["dram_bandwidth"]: 2e11 * i,
+                names["dram_bytes"]: 4096 * i,
+                names["dram_bytes_read"]: 3000 * i,
+                names["dram_bytes_write"]: 1096 * i,
+                names["duration"]: 1000 + 500 * i,
+            }
+            for i in range(1, 4)
+        ]
+
+        def make_kernel(metrics):
+            return SimpleNamespace(
+                metric_by_name=lambda name: SimpleNamespace(value=lambda: metrics[name])
+            )
+
+        default_range = SimpleNamespace(
+            num_actions=lambda: len(kernels),
+            action_by_idx=lambda i: make_kernel(kernels[i]),
+        )
+        report = SimpleNamespace(
+            num_ranges=lambda: 1, range_by_idx=lambda i: default_range
+        )
+        stub_ncu_report = SimpleNamespace(load_report=lambda path: report)
+        with tempfile.NamedTemporaryFile(
+            suffix=".ncu-rep"
+        ) as report_file, mock.patch.object(
+            ncu_analyzer, "_ncu_report_module", stub_ncu_report
+        ):
+            results = ncu_analyzer.read_ncu_report(
+                report_file.name,
+                ["memory_traffic", "arithmetic_intensity", "ncu_tflops"],
+            )
+
+        def get_flops(k):
+            fp32 = k[names["inst_executed_fadd"]] + k[names["inst_executed_fmul"]]
+            fp32 += 2 * k[names["inst_executed_ffma"]]
+            fp64 = k[names["inst_executed_dadd"]] + k[names["inst_executed_dmul"]]
+            fp64 += 2 * k[names["inst_executed_dfma"]]
+            return fp32 * k[names["sm_freq"]], fp64 * k[names["sm_freq"]]
+
+        flops = [get_flops(k) for k in kernels]
+        durations = [k[names["duration"]] for k in kernels]
+        dram_bytes = [k[names["dram_bytes"]] for k in kernels]
+        ai = [
+            (fp32 / k[names["dram_bandwidth"]], fp64 / k[names["dram_bandwidth"]])
+            for (fp32, fp64), k in zip(flops, kernels)
+        ]
+        for p in range(2):
+            self.assertAlmostEqual(
+                results["arithmetic_intensity"][p]
+                / (sum(a[p] * b for a, b in zip(ai, dram_bytes)) / sum(dram_bytes)),
+                1.0,
+            )
+            self.assertAlmostEqual(
+                results["ncu_tflops"][p]
+                / (
+                    sum(f[p] * d for f, d in zip(flops, durations))
+                    / 10**12
+                    / sum(durations)
+                ),
+                1.0,
+            )
+            for actual, expected in zip(results["arithmetic_intensity_raw"], ai):
+                self.assertAlmostEqual(actual[p] / expected[p], 1.0)
+        self.assertEqual(results["durations"], durations)
+        self.assertEqual(
+            results["memory_traffic"],
+            (
+                sum(k[names["dram_bytes_read"]] for k in kernels),
+                sum(k[names["dram_bytes_write"]] for k in kernels),
+            ),
+        )
+        self.assertIsInstance(results["memory_traffic"][0], int)
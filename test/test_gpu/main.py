@@ -1,4 +1,5 @@
 import logging
+import shutil
 import unittest
 
 from typing import Dict, List
@@ -147,6 +148,49 @@ class TestTritonbenchGpu(unittest.TestCase):
     pass
 
 
+@unittest.skipIf(shutil.which("nsys") is None, "nsys is not installed")
+class TestNsysAnalyzer(unittest.TestCase):
+    def test_nsys_metrics_multi_kernel(self):
+        # naive_softmax launches several torch kernels in the nvtx range
+        nsys_metrics = [
+            "nsys_kernel_names",
+            "nsys_kernel_durations",
+            "nsys_num_of_kernels",
+            "nsys_gpu_kernel_sum",
+            "nsys_nvtx_range_duration",
+        ]
+        args = [
+            "--op",
+            "softmax",
+            "--device",
+            "cuda",
+            "--num-inputs",
+            "1",
+            "--only",
+            "naive_softmax",
+            "--metrics",
+            ",".join(nsys_metrics),
+            "--test-only",
+        ]
+        parser = get_parser(args)
+        tb_args, extra_args = parser.parse_known_args(args)
+        Operator = load_opbench_by_name(tb_args.op)
+        op = Operator(tb_args=tb_args, extra_args=extra_args)
+        op.run()
+        metrics = op.output.result[0][1]["naive_softmax"].extra_metrics
+        num_of_kernels = metrics["nsys_num_of_kernels"]
+        self.assertGreater(num_of_kernels, 1)
+        self.assertEqual(len(metrics["nsys_kernel_names"]), num_of_kernels)
+        self.assertEqual(len(metrics["nsys_kernel_durations"]), num_of_kernels)
+        self.assertAlmostEqual(
+            sum(float(duration) for duration in metrics["nsys_kernel_durations"]),
+            metrics["nsys_gpu_kernel_sum"],
+        )
+        self.assertGreaterEqual(
+            metrics["nsys_nvtx_range_duration"], metrics["nsys_gpu_kernel_sum"]
+        )
+
+
 for operator in TEST_OPERATORS:
     setattr(
         TestTritonbenchGpu,
@@ -1,8 +1,11 @@
+import functools
 import os
 import shutil
 import sys
-from collections import defaultdict
-from typing import List
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
 
 """
 A dictionary mapping short metric names to their corresponding NVIDIA Nsight Compute
@@ -57,6 +60,63 @@ bench_metric_to_short_ncu_metric = {
         "sm_freq",
     ],
 }
+# The full NCU metric names of each benchmark metric, resolved once at import time.
+_bench_metric_to_full_ncu_metric = {
+    bench_metric: tuple(short_ncu_metric_name[short] for short in short_ncu_metrics)
+    for bench_metric, short_ncu_metrics in bench_metric_to_short_ncu_metric.items()
+}
+
+# The full NCU metric names used per kernel when reading a report, resolved once at
+# import time.
+_M_DURATION = short_ncu_metric_name["duration"]
+_M_SM_FREQ = short_ncu_metric_name["sm_freq"]
+_M_DRAM_BYTES = short_ncu_metric_name["dram_bytes"]
+_M_DRAM_BANDWIDTH = short_ncu_metric_name["dram_bandwidth"]
+_M_DRAM_BYTES_READ = short_ncu_metric_name["dram_bytes_read"]
+_M_DRAM_BYTES_WRITE = short_ncu_metric_name["dram_bytes_write"]
+_M_INST_EXECUTED_FADD = short_ncu_metric_name["inst_executed_fadd"]
+_M_INST_EXECUTED_FMUL = short_ncu_metric_name["inst_executed_fmul"]
+_M_INST_EXECUTED_FFMA = short_ncu_metric_name["inst_executed_ffma"]
+_M_INST_EXECUTED_DADD = short_ncu_metric_name["inst_executed_dadd"]
+_M_INST_EXECUTED_DMUL = short_ncu_metric_name["inst_executed_dmul"]
+_M_INST_EXECUTED_DFMA = short_ncu_metric_name["inst_executed_dfma"]
+
+# The columns of the per-kernel metric matrix reduced by _reduce_kernel_metrics.
+_KERNEL_METRIC_COLUMNS = (
+    _M_DURATION,
+    _M_SM_FREQ,
+    _M_INST_EXECUTED_FADD,
+    _M_INST_EXECUTED_FMUL,
+    _M_INST_EXECUTED_FFMA,
+    _M_INST_EXECUTED_DADD,
+    _M_INST_EXECUTED_DMUL,
+    _M_INST_EXECUTED_DFMA,
+    _M_DRAM_BYTES,
+    _M_DRAM_BANDWIDTH,
+    _M_DRAM_BYTES_READ,
+    _M_DRAM_BYTES_WRITE,
+)
+(
+    _DURATION,
+    _SM_FREQ,
+    _FADD,
+    _FMUL,
+    _FFMA,
+    _DADD,
+    _DMUL,
+    _DFMA,
+    _DRAM_BYTES,
+    _DRAM_BANDWIDTH,
+    _DRAM_BYTES_READ,
+    _DRAM_BYTES_WRITE,
+) = range(len(_KERNEL_METRIC_COLUMNS))
+
+# The resolved path of the 'ncu' command, see _get_ncu_bin().
+_NCU_BIN = None
+# The NCU 'extras/python' directory once it has been added to sys.path.
+_NCU_PYTHON_PATH = None
+# The imported NCU 'ncu_report' module, see _get_ncu_report_module().
+_ncu_report_module = None
 
 
 def get_ncu_metrics(metrics: List[str]) -> List[str]:
@@ -64,70 +124,126 @@ def get_ncu_metrics(metrics: List[str]) -> List[str]:
     This function returns a list of all the NCU metrics used in the benchmark.
 
     Returns:
-        list: A list of all the NCU metrics used in the benchmark.
+        list: A sorted list of the unique NCU metrics used in the benchmark. Duplicated
+        metrics would make NCU schedule extra kernel replay passes.
     """
-    ncu_metrics = []
-    for (
-        bench_metric,
-        short_ncu_metrics,
-    ) in bench_metric_to_short_ncu_metric.items():
-        # Only process metrics that are required
-        if bench_metric in metrics:
-            # For each short metric name in the list of metrics for this benchmark metric
-            for short_ncu_metric in short_ncu_metrics:
-                # Get the full NCU metric name and add it to our list
-                full_metric_name = short_ncu_metric_name[short_ncu_metric]
-                ncu_metrics.append(full_metric_name)
-    return ncu_metrics
+    # Only process metrics that are required
+    return sorted(
+        {
+            full_metric_name
+            for bench_metric in metrics
+            if bench_metric in _bench_metric_to_full_ncu_metric
+            for full_metric_name in _bench_metric_to_full_ncu_metric[bench_metric]
+        }
+    )
+
+
+def _get_ncu_bin() -> str:
+    """
+    Return the path of the 'ncu' command. It is only searched in the system PATH on the
+    first call.
+
+    Raises:
+        FileNotFoundError: If the 'ncu' command is not found in the system PATH.
+    """
+    global _NCU_BIN
+    if _NCU_BIN is None:
+        ncu_bin = shutil.which("ncu")
+        if not ncu_bin:
+            raise FileNotFoundError("Could not find 'ncu' command in PATH.")
+        _NCU_BIN = ncu_bin
+    return _NCU_BIN
 
 
 def _import_ncu_python_path():
     """
     This function modifies the Python path to include the NVIDIA Nsight Compute (NCU) Python modules.
     It searches for the 'ncu' command in the system PATH, determines its location, and appends the
-    'extras/python' directory to the Python path.
+    'extras/python' directory to the Python path. The lookup only happens once per process.
 
     Raises:
         FileNotFoundError: If the 'ncu' command is not found in the system PATH.
         FileNotFoundError: If the 'extras/python' directory does not exist in the determined NCU path.
     """
-    ncu_path = shutil.which("ncu")
-    if not ncu_path:
-        raise FileNotFoundError("Could not find 'ncu' command in PATH.")
-    ncu_path = os.path.dirname(ncu_path)
-    if not os.path.exists(os.path.join(ncu_path, "extras/python")):
+    global _NCU_PYTHON_PATH
+    if _NCU_PYTHON_PATH is not None:
+        return
+    ncu_path = os.path.dirname(_get_ncu_bin())
+    ncu_python_path = os.path.join(ncu_path, "extras/python")
+    if not os.path.exists(ncu_python_path):
         raise FileNotFoundError(
             f"'extras/python' does not exist in the provided ncu_path: {ncu_path}"
         )
-    sys.path.append(os.path.join(ncu_path, "extras/python"))
+    if ncu_python_path not in sys.path:
+        sys.path.append(ncu_python_path)
+    _NCU_PYTHON_PATH = ncu_python_path
+
+
+def _get_ncu_report_module():
+    """
+    Import the NCU 'ncu_report' Python module on first use and return the cached module
+    on subsequent calls.
+    """
+    global _ncu_report_module
+    if _ncu_report_module is None:
+        _import_ncu_python_path()
+        import ncu_report
+
+        _ncu_report_module = ncu_report
+    return _ncu_report_module
+
 
+@functools.lru_cache(maxsize=None)
+def _make_kernel_extractor(
+    bench_metrics: FrozenSet[str],
+) -> Callable[[Any, np.ndarray, int], None]:
+    """
+    Build the function writing the row of a kernel in the per-kernel metric matrix,
+    specialized to the required benchmark metrics: only the NCU metrics they use are
+    read from the kernel and the other columns are left untouched.
+
+    Args:
+        bench_metrics: The required benchmark metrics, keys of
+            bench_metric_to_short_ncu_metric
 
-def get_mem_traffic(kernel):
-    return (
-        kernel.metric_by_name(short_ncu_metric_name["dram_bytes_read"]).value(),
-        kernel.metric_by_name(short_ncu_metric_name["dram_bytes_write"]).value(),
+    Returns:
+        Callable: A function taking an NCU kernel object, the metric matrix and the
+        row of the kernel in it.
+    """
+    required_metric_names = {
+        full_metric_name
+        for bench_metric in bench_metrics
+        for full_metric_name in _bench_metric_to_full_ncu_metric[bench_metric]
+    }
+    columns = tuple(
+        (column, metric_name)
+        for column, metric_name in enumerate(_KERNEL_METRIC_COLUMNS)
+        if metric_name in required_metric_names
     )
 
+    def extract(kernel, metric_matrix: np.ndarray, i: int) -> None:
+        for column, metric_name in columns:
+            metric_matrix[i, column] = kernel.metric_by_name(metric_name).value()
 
-def get_duration(kernel):
-    return kernel.metric_by_name(short_ncu_metric_name["duration"]).value()
+    return extract
 
 
-def get_flops(kernel):
+def _reduce_kernel_metrics(metric_matrix: np.ndarray):
     """
-    Calculate the achieved floating point operations per second (FLOPS) for both FP32 and FP64 operations.
+    Reduce the (num_kernels, len(_KERNEL_METRIC_COLUMNS)) matrix of per-kernel NCU
+    metrics.
 
-    This function calculates FLOPS by:
+    The achieved floating point operations per second (FLOPS) of each kernel are
+    calculated for both FP32 and FP64 operations by:
     1. Summing up the achieved ADD, MUL and FMA operations (FMA counts as 2 operations)
     2. Multiplying by the SM frequency to get operations per second
 
-    Args:
-        kernel: An NCU kernel object containing the profiling metrics
-
     Returns:
-        tuple: A pair of (fp32_flops, fp64_flops) containing:
-            - fp32_flops: Achieved single precision (FP32) FLOPS
-            - fp64_flops: Achieved double precision (FP64) FLOPS
+        tuple: (flops, weighted_flops, column_sums) containing:
+            - flops: (num_kernels, 2) achieved (FP32, FP64) FLOPS of each kernel
+            - weighted_flops: (2,) sum of the (FP32, FP64) FLOPS weighted by the
+              kernel durations
+            - column_sums: the sum of each column of the metric matrix
 
     Reference:
         Implementation based on NVIDIA Nsight Compute's SpeedOfLight_Roofline.py and
@@ -135,51 +251,57 @@ def get_flops(kernel):
 
     TODO: Add Tensor FLOPS and Half Precision FLOPS
     """
-    fp32_add_achieved = kernel.metric_by_name(
-        short_ncu_metric_name["inst_executed_fadd"]
-    ).value()
-    fp32_mul_achieved = kernel.metric_by_name(
-        short_ncu_metric_name["inst_executed_fmul"]
-    ).value()
-    fp32_fma_achieved = kernel.metric_by_name(
-        short_ncu_metric_name["inst_executed_ffma"]
-    ).value()
-    fp32_achieved = fp32_add_achieved + fp32_mul_achieved + 2 * fp32_fma_achieved
-    fp64_add_achieved = kernel.metric_by_name(
-        short_ncu_metric_name["inst_executed_dadd"]
-    ).value()
-    fp64_mul_achieved = kernel.metric_by_name(
-        short_ncu_metric_name["inst_executed_dmul"]
-    ).value()
-    fp64_fma_achieved = kernel.metric_by_name(
-        short_ncu_metric_name["inst_executed_dfma"]
-    ).value()
-    fp64_achieved = fp64_add_achieved + fp64_mul_achieved + 2 * fp64_fma_achieved
-    sm_freq = kernel.metric_by_name(short_ncu_metric_name["sm_freq"]).value()
-    fp32_flops = fp32_achieved * sm_freq
-    fp64_flops = fp64_achieved * sm_freq
-    return fp32_flops, fp64_flops
-
-
-def get_arithmetic_intensity(kernel):
-    dram_bandwidth = kernel.metric_by_name(
-        short_ncu_metric_name["dram_bandwidth"]
-    ).value()
-    fp32_flops, fp64_flops = get_flops(kernel)
-    fp32_arithmetic_intensity = fp32_flops / dram_bandwidth
-    fp64_arithmetic_intensity = fp64_flops / dram_bandwidth
-    return fp32_arithmetic_intensity, fp64_arithmetic_intensity
-
-
-def read_ncu_report(report_path: str, required_metrics: List[str]):
+    durations = metric_matrix[:, _DURATION]
+    sm_freq = metric_matrix[:, _SM_FREQ]
+    flops = np.empty((metric_matrix.shape[0], 2), dtype=np.float64)
+    flops[:, 0] = (
+        metric_matrix[:, _FADD] + metric_matrix[:, _FMUL] + 2 * metric_matrix[:, _FFMA]
+    ) * sm_freq
+    flops[:, 1] = (
+        metric_matrix[:, _DADD] + metric_matrix[:, _DMUL] + 2 * metric_matrix[:, _DFMA]
+    ) * sm_freq
+    return flops, durations @ flops, metric_matrix.sum(axis=0)
+
+
+@dataclass
+class _NcuReportResults:
+    """
+    The metrics read from an NCU report. Only the fields of the required metrics are
+    set, the tuples are (read, write) for memory traffic and (fp32, fp64) otherwise.
+    """
+
+    # per-kernel durations
+    durations: Optional[List[float]] = None
+    # per-kernel memory traffic
+    memory_traffic_raw: Optional[List[Tuple[float, float]]] = None
+    # per-kernel arithmetic intensity
+    arithmetic_intensity_raw: Optional[List[Tuple[float, float]]] = None
+    # per-kernel FLOPS
+    ncu_tflops_raw: Optional[List[Tuple[float, float]]] = None
+    # total memory traffic
+    memory_traffic_read_sum: Optional[float] = None
+    memory_traffic_write_sum: Optional[float] = None
+    memory_traffic: Optional[Tuple[float, float]] = None
+    # arithmetic intensity weighted by the DRAM traffic of the kernels
+    weighted_fp32_arithmetic_intensity: Optional[float] = None
+    weighted_fp64_arithmetic_intensity: Optional[float] = None
+    arithmetic_intensity: Optional[Tuple[float, float]] = None
+    # TFLOPS weighted by the duration of the kernels
+    ncu_tflops: Optional[Tuple[float, float]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the metrics that were set as a {metric_name: metric_value} dict."""
+        values = {field.name: getattr(self, field.name) for field in fields(self)}
+        return {name: value for name, value in values.items() if value is not None}
+
+
+def read_ncu_report(report_path: str, required_metrics: List[str]) -> Dict[str, Any]:
     assert os.path.exists(
         report_path
     ), f"The NCU report at {report_path} does not exist."
-    _import_ncu_python_path()
-    import ncu_report
+    ncu_report = _get_ncu_report_module()
 
-    # save all kernels' metrics. {metric_name: [kernel1_metric_value, kernel2_metric_value, ...]}
-    results = defaultdict(list)
+    results = _NcuReportResults()
     test_report = ncu_report.load_report(report_path)
     assert (
         test_report.num_ranges() > 0
@@ -188,70 +310,70 @@ def read_ncu_report(report_path: str, required_metrics: List[str]):
     assert (
         default_range.num_actions() > 0
     ), f"No profile data found in the default range of the NCU report at {report_path}"
-    total_duration = 0
-    total_dram_bytes = 0
-    weighted_fp32_ai_sum = 0
-    weighted_fp64_ai_sum = 0
-    for i in range(default_range.num_actions()):
-        kernel = default_range.action_by_idx(i)
-        if set(required_metrics) & {"arithmetic_intensity", "ncu_tflops"}:
-            duration = get_duration(kernel)
-            results["durations"].append(duration)
-            total_duration += duration
-        if "memory_traffic" in required_metrics:
-            results["memory_traffic_raw"].append(get_mem_traffic(kernel))
-        if "arithmetic_intensity" in required_metrics:
-            dram_bytes = kernel.metric_by_name(
-                short_ncu_metric_name["dram_bytes"]
-            ).value()
-            fp32_ai, fp64_ai = get_arithmetic_intensity(kernel)
-            weighted_fp32_ai_sum += fp32_ai * dram_bytes
-            weighted_fp64_ai_sum += fp64_ai * dram_bytes
-            # do not use the arithmetic_intensity_raw in benchmark metric argument
-            # because metric printer will only print the first element of the list
-            results["arithmetic_intensity_raw"].append((fp32_ai, fp64_ai))
-            total_dram_bytes += dram_bytes
-        if "ncu_tflops" in required_metrics:
-            results["ncu_tflops_raw"].append(get_flops(kernel))
+    need_flops = bool(set(required_metrics) & {"arithmetic_intensity", "ncu_tflops"})
+    # The per-kernel code path only depends on the set of required benchmark metrics,
+    # so it is built once per set instead of checking the metrics for every kernel.
+    extract_kernel = _make_kernel_extractor(
+        frozenset(set(required_metrics) & bench_metric_to_short_ncu_metric.keys())
+    )
+
+    num_kernels = default_range.num_actions()
+    metric_matrix = np.zeros((num_kernels, len(_KERNEL_METRIC_COLUMNS)))
+    for i in range(num_kernels):
+        extract_kernel(default_range.action_by_idx(i), metric_matrix, i)
+    if need_flops:
+        flops, weighted_flops, column_sums = _reduce_kernel_metrics(metric_matrix)
+    else:
+        # memory_traffic only needs the column sums, not the FLOPS
+        column_sums = metric_matrix.sum(axis=0)
 
+    # The per-kernel tuples are (read, write) or (fp32, fp64).
+    durations = metric_matrix[:, _DURATION]
+    # The durations (ns) and DRAM bytes are integer metrics in ncu_report, report them
+    # as ints rather than the float64 of the metric matrix.
+    if need_flops:
+        results.durations = durations.astype(np.int64).tolist()
     if "memory_traffic" in required_metrics:
-        memory_traffic_read = [item[0] for item in results["memory_traffic_raw"]]
-        memory_traffic_write = [item[1] for item in results["memory_traffic_raw"]]
-        results["memory_traffic_read_sum"] = sum(memory_traffic_read)
-        results["memory_traffic_write_sum"] = sum(memory_traffic_write)
-        results["memory_traffic"] = (
-            results["memory_traffic_read_sum"],
-            results["memory_traffic_write_sum"],
+        memory_traffic = metric_matrix[:, [_DRAM_BYTES_READ, _DRAM_BYTES_WRITE]]
+        results.memory_traffic_raw = [
+            tuple(row) for row in memory_traffic.astype(np.int64).tolist()
+        ]
+        results.memory_traffic_read_sum = int(column_sums[_DRAM_BYTES_READ])
+        results.memory_traffic_write_sum = int(column_sums[_DRAM_BYTES_WRITE])
+        results.memory_traffic = (
+            results.memory_traffic_read_sum,
+            results.memory_traffic_write_sum,
         )
     if "arithmetic_intensity" in required_metrics:
-        results["weighted_fp32_arithmetic_intensity"] = (
-            weighted_fp32_ai_sum / total_dram_bytes
+        # The arithmetic intensity is FLOPS / DRAM bandwidth. Both are rates, so it
+        # does not depend on the time unit of the report.
+        arithmetic_intensity = flops / metric_matrix[:, _DRAM_BANDWIDTH][:, np.newaxis]
+        # do not use the arithmetic_intensity_raw in benchmark metric argument
+        # because metric printer will only print the first element of the list
+        results.arithmetic_intensity_raw = [
+            tuple(row) for row in arithmetic_intensity.tolist()
+        ]
+        # weight each kernel's arithmetic intensity by its DRAM traffic
+        weighted_fp32_ai, weighted_fp64_ai = (
+            metric_matrix[:, _DRAM_BYTES]
+            @ arithmetic_intensity
+            / column_sums[_DRAM_BYTES]
         )
-        results["weighted_fp64_arithmetic_intensity"] = (
-            weighted_fp64_ai_sum / total_dram_bytes
-        )
-        results["arithmetic_intensity"] = (
-            results["weighted_fp32_arithmetic_intensity"],
-            results["weighted_fp64_arithmetic_intensity"],
+        results.weighted_fp32_arithmetic_intensity = float(weighted_fp32_ai)
+        results.weighted_fp64_arithmetic_intensity = float(weighted_fp64_ai)
+        results.arithmetic_intensity = (
+            results.weighted_fp32_arithmetic_intensity,
+            results.weighted_fp64_arithmetic_intensity,
         )
     if "ncu_tflops" in required_metrics:
-        assert results["durations"], "No kernel durations found in the NCU report."
-        weighted_fp32_flops_sum = sum(
-            flop[0] * dur
-            for flop, dur in zip(results["ncu_tflops_raw"], results["durations"])
-        )
-        weighted_fp64_flops_sum = sum(
-            flop[1] * dur
-            for flop, dur in zip(results["ncu_tflops_raw"], results["durations"])
+        assert durations.size, "No kernel durations found in the NCU report."
+        results.ncu_tflops_raw = [tuple(row) for row in flops.tolist()]
+        # weight each kernel's FLOPS by its duration and convert to TFLOPS
+        weighted_fp32_tflops, weighted_fp64_tflops = (
+            weighted_flops / (10**12) / column_sums[_DURATION]
         )
-        weighted_fp32_tflops_sum = weighted_fp32_flops_sum / (
-            10**12
-        )  # Convert to TFLOPS
-        weighted_fp64_tflops_sum = weighted_fp64_flops_sum / (
-            10**12
-        )  # Convert to TFLOPS
-        results["ncu_tflops"] = (
-            weighted_fp32_tflops_sum / total_duration,
-            weighted_fp64_tflops_sum / total_duration,
+        results.ncu_tflops = (
+            float(weighted_fp32_tflops),
+            float(weighted_fp64_tflops),
         )
-    return results
+    return results.to_dict()
@@ -1,7 +1,11 @@
 import csv
+import io
 import os
 import subprocess
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
 
 # The nsys metrics to the reports. The value is the list of reports of nsys.
 nsys_metrics_to_reports = {
@@ -28,6 +32,72 @@ def get_nsys_metrics(metrics: List[str]) -> List[str]:
     return nsys_metrics
 
 
+def _run_nsys_command(cmd: List[str]) -> str:
+    try:
+        proc = subprocess.run(cmd, capture_output=True, check=True, text=True)
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to run nsys command: {' '.join(cmd)}\nError: {e}\n{e.stderr}")
+        raise e
+    return proc.stdout
+
+
+def _export_nsys_sqlite(report_path: str) -> str:
+    """
+    Export the nsys report to a sqlite database next to it and return the database
+    path. The database is always re-exported, because tritonbench overwrites the nsys
+    report at the same path.
+    """
+    sqlite_path = f"{os.path.splitext(report_path)[0]}.sqlite"
+    _run_nsys_command(
+        [
+            "nsys",
+            "export",
+            "--type",
+            "sqlite",
+            "--force-overwrite=true",
+            "--output",
+            sqlite_path,
+            report_path,
+        ]
+    )
+    return sqlite_path
+
+
+def _run_nsys_stats(sqlite_path: str, report: str) -> str:
+    """
+    Run `nsys stats` for a single report on the exported sqlite database and return
+    its CSV output. The CSV is streamed on stdout instead of being written to disk.
+    """
+    return _run_nsys_command(
+        [
+            "nsys",
+            "stats",
+            "--report",
+            report,
+            "--timeunit",
+            "ns",
+            "--format",
+            "csv",
+            "--output",
+            "-",
+            sqlite_path,
+        ]
+    )
+
+
+def _parse_nsys_csv(output: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Parse the CSV output of `nsys stats` into a (header, rows) pair. nsys may print
+    notices such as "Processing [...] with [...]..." before the CSV table, they are
+    skipped.
+    """
+    reader = csv.reader(io.StringIO(output))
+    for header in reader:
+        if len(header) > 1:
+            return header, [row for row in reader if row]
+    raise RuntimeError(f"No CSV table found in the nsys stats output:\n{output}")
+
+
 def read_nsys_report(
     report_path: str, required_metrics: List[str]
 ) -> Dict[str, List[float]]:
@@ -38,48 +108,46 @@ def read_nsys_report(
     for metric in required_metrics:
         if metric in nsys_metrics_to_reports:
             reports_required.extend(nsys_metrics_to_reports[metric])
-    reports_required = list(set(reports_required))
+    reports_required = sorted(set(reports_required))
     assert reports_required, "No nsys reports required"
-    cmd = f"nsys stats --report {','.join(reports_required)} --timeunit ns --force-export=true --format csv --output . --force-overwrite=true {report_path}"
-    try:
-        subprocess.check_call(
-            cmd.split(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
-        )
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to run nsys command: {cmd}\nError: {e}")
-        raise e
-    # Get the base path and filename without extension
-    base_path = os.path.dirname(report_path)
-    base_name = os.path.splitext(os.path.basename(report_path))[0]
-
     results = {}
-    csv_contents = {}
+    # Export the sqlite database once, then generate the reports from it in parallel.
+    # Each `nsys stats` only reads the database, so they are independent.
+    sqlite_path = _export_nsys_sqlite(report_path)
 
-    for report in reports_required:
-        csv_path = os.path.join(base_path, f"{base_name}_{report}.csv")
-        if not os.path.exists(csv_path):
-            raise RuntimeError(f"Expected CSV report not found at {csv_path}")
+    def generate_report(report: str) -> Tuple[List[str], List[List[str]]]:
+        return _parse_nsys_csv(_run_nsys_stats(sqlite_path, report))
 
-        # Read CSV using DictReader
-        with open(csv_path, "r") as f:
-            reader = csv.DictReader(f)
-            csv_contents[report] = list(reader)
+    with ThreadPoolExecutor(max_workers=len(reports_required)) as executor:
+        csv_contents = dict(
+            zip(reports_required, executor.map(generate_report, reports_required))
+        )
     kernel_duration = []
     kernel_names = []
+    num_of_kernels = 0
     sum_kernel_duration = 0
     nvtx_range_duration = 0
     if "nvtx_kern_sum" in csv_contents:
         # gpu kernel execution time summary
-        for row in csv_contents["nvtx_kern_sum"]:
-            # use ms as the unit
-            kernel_duration.append(float(row["Total Time (ns)"]) / 1_000_000)
-            kernel_names.append(row["Kernel Name"])
-        sum_kernel_duration = sum(kernel_duration)
+        header, rows = csv_contents["nvtx_kern_sum"]
+        time_idx = header.index("Total Time (ns)")
+        # use ms as the unit
+        kernel_duration_ms = (
+            np.array([row[time_idx] for row in rows], dtype=np.float64) / 1_000_000
+        )
+        if "nsys_kernel_durations" in required_metrics:
+            kernel_duration = kernel_duration_ms.tolist()
+        if "nsys_kernel_names" in required_metrics:
+            name_idx = header.index("Kernel Name")
+            kernel_names = [row[name_idx] for row in rows]
+        num_of_kernels = len(rows)
+        sum_kernel_duration = float(kernel_duration_ms.sum())
     if "nvtx_sum" in csv_contents:
         # It is supposed to be only one row. The nvtx range is `:tritonbench_range`
-        assert len(csv_contents["nvtx_sum"]) == 1
+        header, rows = csv_contents["nvtx_sum"]
+        assert len(rows) == 1
         nvtx_range_duration = (
-            float(csv_contents["nvtx_sum"][0]["Total Time (ns)"]) / 1_000_000
+            float(rows[0][header.index("Total Time (ns)")]) / 1_000_000
         )
 
     # Define mapping of metrics to their values. The keys must be in nsys_bench_metrics.
@@ -91,7 +159,7 @@ def read_nsys_report(
         "nsys_gpu_kernel_sum": sum_kernel_duration,
         "nsys_nvtx_range_duration": nvtx_range_duration,
         "nsys_launch_overhead": nvtx_range_duration - sum_kernel_duration,
-        "nsys_num_of_kernels": len(kernel_names),
+        "nsys_num_of_kernels": num_of_kernels,
     }
     # Verify that metrics_map keys match nsys_metrics_to_reports keys
     assert set(metrics_map.keys()) == set(nsys_metrics_to_reports.keys()), (